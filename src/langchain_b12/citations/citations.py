@@ -1,10 +1,15 @@
+import asyncio
+import hashlib
 import re
+import time
+from collections import OrderedDict
 from collections.abc import Sequence
 from typing import Any, Literal, TypedDict
 from uuid import UUID
 
 from langchain_core.callbacks import Callbacks
 from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps
 from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
 from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, LLMResult
 from langchain_core.runnables import Runnable
@@ -53,6 +58,11 @@ For the example above, the output should look like this:
 ]
 """.strip()  # noqa: E501
 
+# Split after punctuation followed by spaces, or on newlines
+# Use capturing groups to preserve delimiters (spaces and newlines)
+_SENTENCE_SPLIT = re.compile(r"((?<=[.!?])(?= +)|\n+)")
+_CONTEXT_TAG = re.compile(r"<context\s+key=[^>]+>.*?</context>", re.DOTALL)
+
 
 class Match(TypedDict):
     start: int
@@ -96,56 +106,159 @@ class Citations(BaseModel):
     values: list[Citation] = Field(..., description="List of citations")
 
 
+class CitationCache:
+    """In-memory LRU cache for the output of the citation model.
+
+    Entries expire `ttl` seconds after they were added.
+    Pass an instance to `add_citations` or `create_citation_model` to skip the
+    citation model invocation for conversations that were cited before.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[bytes, tuple[float, Citations]] = OrderedDict()
+
+    @staticmethod
+    def key(
+        model: BaseChatModel, messages: Sequence[BaseMessage], **kwargs: Any
+    ) -> bytes:
+        """Compute the cache key of a citation model invocation."""
+        digest = hashlib.blake2b(digest_size=32)
+        digest.update(model._get_llm_string(**kwargs).encode())
+        digest.update(dumps(list(messages)).encode())
+        return digest.digest()
+
+    def lookup(self, key: bytes) -> Citations | None:
+        """Return the cached citations, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, citations = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return citations
+
+    def update(self, key: bytes, citations: Citations) -> None:
+        """Store the citations, evicting the least recently used entry if full."""
+        self._entries[key] = (time.monotonic() + self.ttl, citations)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        self._entries.clear()
+
+
 def split_into_sentences(text: str) -> list[str]:
     """Split text into sentences on punctuation marks and newlines."""
     if not text:
         return [text]
 
-    # Split after punctuation followed by spaces, or on newlines
-    # Use capturing groups to preserve delimiters (spaces and newlines)
-    parts = re.split(r"((?<=[.!?])(?= +)|\n+)", text)
+    parts = _SENTENCE_SPLIT.split(text)
 
     # Filter out empty strings that can result from splitting
     return [part for part in parts if part]
 
 
+def split_and_number(text: str) -> tuple[list[str], str]:
+    """Split text into sentences and number them, one sentence per line.
+
+    Returns the sentences and the numbered text, e.g. "0: Grass is green.".
+    """
+    sentences = split_into_sentences(text)
+    num_width = len(str(len(sentences)))
+    lines = [
+        f"{str(i).rjust(num_width)}: {sentence.strip()}"
+        for i, sentence in enumerate(sentences)
+    ]
+    return sentences, "\n".join(lines)
+
+
 def contains_context_tags(text: str) -> bool:
     """Check if the text contains context tags."""
-    return bool(re.search(r"<context\s+key=[^>]+>.*?</context>", text, re.DOTALL))
+    return bool(_CONTEXT_TAG.search(text))
+
+
+def messages_contain_context_tags(messages: Sequence[BaseMessage]) -> bool:
+    """Check if any of the messages contains context tags."""
+    return any(contains_context_tags(str(msg.content)) for msg in messages)
 
 
 def merge_citations(
     sentences: list[str], citations: list[tuple[Citation, Match | None]]
 ) -> list[ContentType]:
     """Merge citations into sentences."""
-    content: list[ContentType] = []
-    for sentence_index, sentence in enumerate(sentences):
-        _citations: list[CitationType] = []
-        for citation, match in citations:
-            if citation.sentence_index == sentence_index:
-                if match is None:
-                    _citations.append(
-                        {
-                            "cited_text": None,
-                            "generated_cited_text": citation.cited_text,
-                            "key": citation.key,
-                            "dist": None,
-                        }
-                    )
-                else:
-                    _citations.append(
-                        {
-                            "cited_text": match["matched"],
-                            "generated_cited_text": citation.cited_text,
-                            "key": citation.key,
-                            "dist": match["dist"],
-                        }
-                    )
-        content.append(
-            {"text": sentence, "citations": _citations or None, "type": "text"}
-        )
+    n_sentences = len(sentences)
+    # Group the citations per sentence in a single pass
+    buckets: list[list[CitationType]] = [[] for _ in sentences]
+    for citation, match in citations:
+        if citation.sentence_index < 0 or citation.sentence_index >= n_sentences:
+            continue
+        if match is None:
+            buckets[citation.sentence_index].append(
+                {
+                    "cited_text": None,
+                    "generated_cited_text": citation.cited_text,
+                    "key": citation.key,
+                    "dist": None,
+                }
+            )
+        else:
+            buckets[citation.sentence_index].append(
+                {
+                    "cited_text": match["matched"],
+                    "generated_cited_text": citation.cited_text,
+                    "key": citation.key,
+                    "dist": match["dist"],
+                }
+            )
+
+    return [
+        {"text": sentence, "citations": _citations or None, "type": "text"}
+        for sentence, _citations in zip(sentences, buckets)
+    ]
 
-    return content
+
+def find_match(cited_text: str, texts: Sequence[str]) -> Match | None:
+    """Find the first match of the cited text in the texts, allowing for typos.
+
+    The positions of the match are relative to the texts joined by newlines.
+    """
+    from fuzzysearch import find_near_matches
+
+    if cited_text:
+        # Verbatim citations are found cheaply, only fuzzy search when needed
+        offset = 0
+        for text in texts:
+            start = text.find(cited_text)
+            if start != -1:
+                return Match(
+                    start=offset + start,
+                    end=offset + start + len(cited_text),
+                    dist=0,
+                    matched=cited_text,
+                )
+            offset += len(text) + 1
+
+    # Allow for 10% error distance
+    max_l_dist = max(1, len(cited_text) // 10)
+    offset = 0
+    for text in texts:
+        matches = find_near_matches(cited_text, text, max_l_dist=max_l_dist)
+        if matches:
+            match = matches[0]
+            return Match(
+                start=offset + match.start,
+                end=offset + match.end,
+                dist=match.dist,
+                matched=match.matched,
+            )
+        offset += len(text) + 1
+    return None
 
 
 def validate_citations(
@@ -154,39 +267,21 @@ def validate_citations(
     sentences: list[str],
 ) -> list[tuple[Citation, Match | None]]:
     """Validate the citations. Invalid citations are dropped."""
-    from fuzzysearch import find_near_matches
-
     n_sentences = len(sentences)
 
-    all_text = "\n".join(
-        str(msg.content) for msg in messages if isinstance(msg.content, str)
-    )
+    # Search the messages one by one instead of joining them into one large string
+    texts = [msg.content for msg in messages if isinstance(msg.content, str)]
 
+    # The same text is often cited for several sentences, search it only once
+    matches: dict[str, Match | None] = {}
     citations_with_matches: list[tuple[Citation, Match | None]] = []
     for citation in citations.values:
         if citation.sentence_index < 0 or citation.sentence_index >= n_sentences:
             # discard citations that refer to non-existing sentences
             continue
-        # Allow for 10% error distance
-        max_l_dist = max(1, len(citation.cited_text) // 10)
-        matches = find_near_matches(
-            citation.cited_text, all_text, max_l_dist=max_l_dist
-        )
-        if not matches:
-            citations_with_matches.append((citation, None))
-        else:
-            match = matches[0]
-            citations_with_matches.append(
-                (
-                    citation,
-                    Match(
-                        start=match.start,
-                        end=match.end,
-                        dist=match.dist,
-                        matched=match.matched,
-                    ),
-                )
-            )
+        if citation.cited_text not in matches:
+            matches[citation.cited_text] = find_match(citation.cited_text, texts)
+        citations_with_matches.append((citation, matches[citation.cited_text]))
     return citations_with_matches
 
 
@@ -195,9 +290,20 @@ async def add_citations(
     messages: Sequence[BaseMessage],
     message: AIMessage,
     system_prompt: str,
+    *,
+    cache: CitationCache | None = None,
+    min_length: int = 0,
+    has_contexts: bool | None = None,
     **kwargs: Any,
 ) -> AIMessage:
-    """Add citations to the message."""
+    """Add citations to the message.
+
+    If a cache is given, the citation model is only invoked on a cache miss.
+    If `has_contexts` is given, the messages are not scanned for context tags again.
+    Messages consisting of a single sentence shorter than `min_length` characters,
+    e.g. short confirmations, are returned without citations and without
+    invoking the citation model.
+    """
     if not message.content:
         # Nothing to be done, for example in case of a tool call
         return message
@@ -206,29 +312,37 @@ async def add_citations(
         message.content, str
     ), "Citation agent currently only supports string content."
 
-    if not contains_context_tags("\n".join(str(msg.content) for msg in messages)):
+    if has_contexts is None:
+        has_contexts = messages_contain_context_tags(messages)
+    if not has_contexts:
         # No context tags, nothing to do
         return message
 
-    sentences = split_into_sentences(message.content)
+    sentences, numbered_content = split_and_number(message.content)
 
-    num_width = len(str(len(sentences)))
-    numbered_message = AIMessage(
-        content="\n".join(
-            f"{str(i).rjust(num_width)}: {sentence.strip()}"
-            for i, sentence in enumerate(sentences)
-        ),
-        name=message.name,
-    )
+    if len(sentences) <= 1 and len(message.content) < min_length:
+        # Not worth a citation model invocation
+        message.content = merge_citations(sentences, [])  # type: ignore[assignment]
+        return message
+
+    numbered_message = AIMessage(content=numbered_content, name=message.name)
     system_message = SystemMessage(system_prompt)
     _messages = [system_message, *messages, numbered_message]
 
-    citations = await model.with_structured_output(Citations).ainvoke(
-        _messages, **kwargs
-    )
-    assert isinstance(
-        citations, Citations
-    ), f"Expected Citations from model invocation but got {type(citations)}"
+    cache_key = None
+    citations = None
+    if cache is not None:
+        cache_key = cache.key(model, _messages, **kwargs)
+        citations = cache.lookup(cache_key)
+    if citations is None:
+        citations = await model.with_structured_output(Citations).ainvoke(
+            _messages, **kwargs
+        )
+        assert isinstance(
+            citations, Citations
+        ), f"Expected Citations from model invocation but got {type(citations)}"
+        if cache is not None and cache_key is not None:
+            cache.update(cache_key, citations)
     citations = validate_citations(citations, messages, sentences)
 
     message.content = merge_citations(sentences, citations)  # type: ignore[assignment]
@@ -239,6 +353,9 @@ def create_citation_model(
     model: BaseChatModel,
     citation_model: BaseChatModel | None = None,
     system_prompt: str | None = None,
+    *,
+    cache: CitationCache | None = None,
+    min_length: int = 0,
 ) -> Runnable[Sequence[BaseMessage], AIMessage]:
     """Take a base chat model and wrap it such that it adds citations to the messages.
     Any contexts to be cited should be provided in the messages as XML tags,
@@ -265,6 +382,8 @@ def create_citation_model(
             }
         ]
     )
+    Use `abatch` on the returned runnable to process several conversations
+    concurrently.
 
     Args:
         model: The base chat model to wrap.
@@ -272,6 +391,10 @@ def create_citation_model(
             If None, the base model is used.
         system_prompt: The system prompt to use for the citation model.
             If None, a default prompt is used.
+        cache: A cache for the citation model output.
+            If None, the citation model is invoked for every message.
+        min_length: Single sentence messages shorter than this number of
+            characters are returned without citations.
     """
     citation_model = citation_model or model
     system_prompt = system_prompt or SYSTEM_PROMPT
@@ -280,11 +403,30 @@ def create_citation_model(
         messages: Sequence[BaseMessage],
     ) -> AIMessage:
         """Invoke the model and add citations to the AIMessage."""
-        ai_message = await model.ainvoke(messages)
+        # Scan the (possibly large) contexts while the model generates its answer
+        contexts_task = asyncio.create_task(
+            asyncio.to_thread(messages_contain_context_tags, messages)
+        )
+        try:
+            ai_message = await model.ainvoke(messages)
+        except BaseException:
+            contexts_task.cancel()
+            raise
         assert isinstance(
             ai_message, AIMessage
         ), f"Expected AIMessage from model invocation but got {type(ai_message)}"
-        return await add_citations(citation_model, messages, ai_message, system_prompt)
+        if not await contexts_task:
+            # No context tags, nothing to cite
+            return ai_message
+        return await add_citations(
+            citation_model,
+            messages,
+            ai_message,
+            system_prompt,
+            cache=cache,
+            min_length=min_length,
+            has_contexts=True,
+        )
 
     return RunnableCallable(
         func=None,  # TODO: Implement a sync version if needed
@@ -338,7 +480,7 @@ class CitationMixin(BaseChatModel):
             # We explicitly pass `generate_citations=False` below to sto this recursion.
             return llm_result
 
-        # overwrite each generation with a version that has citations added
+        pending: list[tuple[list[BaseMessage], ChatGeneration, AIMessage]] = []
         for _messages, generations in zip(messages, llm_result.generations):
             for generation in generations:
                 assert isinstance(generation, ChatGeneration) and not isinstance(
@@ -347,13 +489,26 @@ class CitationMixin(BaseChatModel):
                 assert isinstance(
                     generation.message, AIMessage
                 ), f"Expected AIMessage; received {type(generation.message)}"
-                message_with_citations = await add_citations(
+                pending.append((_messages, generation, generation.message))
+
+        # Add citations to all generations concurrently
+        messages_with_citations = await asyncio.gather(
+            *(
+                add_citations(
                     self,
                     _messages,
-                    generation.message,
+                    message,
                     SYSTEM_PROMPT,
                     generate_citations=False,
                 )
-                generation.message = message_with_citations
+                for _messages, _, message in pending
+            )
+        )
+
+        # overwrite each generation with a version that has citations added
+        for (_, generation, _), message_with_citations in zip(
+            pending, messages_with_citations
+        ):
+            generation.message = message_with_citations
 
         return llm_result
@@ -38,6 +38,7 @@ from langchain_core.utils.function_calling import (
 from pydantic import BaseModel, ConfigDict, Field
 
 from langchain_b12.genai.genai_utils import (
+    aconvert_messages_to_contents,
     convert_messages_to_contents,
     parse_response_candidate,
 )
@@ -146,10 +147,8 @@ class ChatGenAI(BaseChatModel):
             ls_params["ls_stop"] = ls_stop
         return ls_params
 
-    def _prepare_request(
-        self, messages: list[BaseMessage]
-    ) -> tuple[str | None, types.ContentListUnion]:
-        contents = convert_messages_to_contents(messages)
+    @staticmethod
+    def _get_system_instruction(messages: list[BaseMessage]) -> str | None:
         system_message: SystemMessage | None = next(
             (message for message in messages if isinstance(message, SystemMessage)),
             None,
@@ -158,6 +157,20 @@ class ChatGenAI(BaseChatModel):
         assert system_instruction is None or isinstance(
             system_instruction, str
         ), "System message content must be a string or None"
+        return system_instruction
+
+    def _prepare_request(
+        self, messages: list[BaseMessage]
+    ) -> tuple[str | None, types.ContentListUnion]:
+        contents = convert_messages_to_contents(messages)
+        system_instruction = self._get_system_instruction(messages)
+        return system_instruction, cast(types.ContentListUnion, contents)
+
+    async def _aprepare_request(
+        self, messages: list[BaseMessage]
+    ) -> tuple[str | None, types.ContentListUnion]:
+        contents = await aconvert_messages_to_contents(messages)
+        system_instruction = self._get_system_instruction(messages)
         return system_instruction, cast(types.ContentListUnion, contents)
 
     def get_num_tokens(self, text: str) -> int:
@@ -264,7 +277,7 @@ class ChatGenAI(BaseChatModel):
         run_manager: AsyncCallbackManagerForLLMRun | None = None,
         **kwargs: Any,
     ) -> AsyncIterator[ChatGenerationChunk]:
-        system_message, contents = self._prepare_request(messages=messages)
+        system_message, contents = await self._aprepare_request(messages=messages)
         response_iter = self.client.aio.models.generate_content_stream(
             model=self.model_name,
             contents=contents,
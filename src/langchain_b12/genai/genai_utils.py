@@ -1,7 +1,7 @@
-import base64
+import asyncio
 import json
 import uuid
-from collections.abc import Sequence
+from collections.abc import Callable, Sequence
 from typing import Any, cast
 
 from google.genai import types
@@ -15,9 +15,169 @@ from langchain_core.messages import (
 )
 from langchain_core.messages.tool import tool_call_chunk
 
+try:
+    # SIMD accelerated decoder, falls back to the standard library
+    from pybase64 import b64decode
+except ImportError:  # pragma: no cover
+    from base64 import b64decode
+
+ContentBlock = dict[str, str | dict[str, str]]
+
+
+def _text_part(content: ContentBlock) -> types.Part | None:
+    assert "text" in content, "Expected 'text' in content"
+    if not content["text"]:
+        return None
+    assert isinstance(content["text"], str), "Expected str content"
+    return types.Part(text=content["text"])
+
+
+def _parse_data_url(url: str) -> tuple[str, str] | None:
+    """Split a "data:<mime_type>;base64,<data>" URL into mime type and data."""
+    # Parse by index to avoid copies
+    comma = url.find(",")
+    if comma == -1:
+        return None
+    semicolon = url.find(";", 0, comma)
+    mime_type = url[url.find(":") + 1 : comma if semicolon == -1 else semicolon]
+    return mime_type, url[comma + 1 :]
+
+
+def _image_url_part(content: ContentBlock) -> types.Part:
+    assert isinstance(content["image_url"], dict), "Expected dict image_url"
+    assert "url" in content["image_url"], "Expected 'url' in content"
+    data_url = _parse_data_url(content["image_url"]["url"])  # type: ignore
+    if data_url is None:
+        raise ValueError("Expected a base64 data URL in image_url")
+    mime_type, encoded_data = data_url
+    data = b64decode(encoded_data)
+    return types.Part.from_bytes(data=data, mime_type=mime_type)
+
+
+def _image_part(content: ContentBlock) -> types.Part:
+    if "data" in content:
+        assert isinstance(content["data"], str), "Expected str data"
+        assert "mime_type" in content, "Expected 'mime_type' in content"
+        assert isinstance(content["mime_type"], str), "Expected str mime_type"
+        data = b64decode(content["data"])
+        return types.Part.from_bytes(data=data, mime_type=content["mime_type"])
+    elif "url" in content:
+        assert isinstance(content["url"], str), "Expected str url"
+        mime_type = content.get("mime_type", None)
+        assert mime_type is None or isinstance(
+            mime_type, str
+        ), "Expected str mime_type"
+        return types.Part.from_uri(file_uri=content["url"], mime_type=mime_type)
+    else:
+        raise ValueError("Expected either 'data' or 'url' in content for image type")
+
+
+def _file_part(content: ContentBlock) -> types.Part:
+    if "data" in content:
+        assert isinstance(content["data"], str), "Expected str data"
+        assert "mime_type" in content, "Expected 'mime_type' in content"
+        assert isinstance(content["mime_type"], str), "Expected str mime_type"
+        data = b64decode(content["data"])
+        return types.Part.from_bytes(data=data, mime_type=content["mime_type"])
+    elif "url" in content:
+        assert isinstance(content["url"], str), "Expected str url"
+        assert content["url"], "File URI is required"
+        mime_type = content.get("mime_type", None)
+        assert mime_type is None or isinstance(
+            mime_type, str
+        ), "Expected str mime_type"
+        return types.Part.from_uri(file_uri=content["url"], mime_type=mime_type)
+    else:
+        raise ValueError("Expected either 'data' or 'url' in content for file type")
+
+
+# Inline payloads up to this many base64 characters are decoded in one batch
+_BATCH_DECODE_SIZE = 16 * 1024
+
+# Messages with more inline data are converted in a worker thread by the async
+# conversion
+_LARGE_INLINE_DATA_SIZE = 64 * 1024
+
+
+def _inline_data(content: Any, max_size: int) -> tuple[str, str] | None:
+    """Return the mime type and base64 data of a valid block with inline data.
+
+    Blocks with more than `max_size` characters of inline data are ignored.
+    """
+    if not isinstance(content, dict):
+        return None
+    content_type = content.get("type")
+    if content_type == "image_url":
+        image_url = content.get("image_url")
+        url = image_url.get("url") if isinstance(image_url, dict) else None
+        if isinstance(url, str) and len(url) <= max_size:
+            return _parse_data_url(url)
+    elif content_type in ("image", "file"):
+        data = content.get("data")
+        mime_type = content.get("mime_type")
+        if (
+            isinstance(data, str)
+            and len(data) <= max_size
+            and isinstance(mime_type, str)
+        ):
+            return mime_type, data
+    return None
+
+
+def _inline_data_size(message: BaseMessage) -> int:
+    """Return the (approximate) number of inline data characters in the message."""
+    if not isinstance(message.content, list):
+        return 0
+    size = 0
+    for content in message.content:
+        if not isinstance(content, dict):
+            continue
+        image_url = content.get("image_url")
+        if isinstance(image_url, dict) and isinstance(image_url.get("url"), str):
+            size += len(image_url["url"])
+        if isinstance(content.get("data"), str):
+            size += len(content["data"])
+    return size
+
+
+def _b64decode_many(payloads: list[str]) -> list[bytes]:
+    """Decode several base64 payloads with a single decoder call.
+
+    Payloads that cannot be concatenated, e.g. because of padding or whitespace,
+    are decoded one by one instead.
+    """
+    # Padding is only valid at the end, so padded payloads cannot be joined
+    if all(len(payload) % 4 == 0 for payload in payloads) and not any(
+        payload.endswith("=") for payload in payloads[:-1]
+    ):
+        try:
+            # Strict validation guarantees that only the last payload is padded
+            data = b64decode("".join(payloads), validate=True)
+        except ValueError:
+            pass
+        else:
+            decoded = []
+            start = 0
+            for payload in payloads[:-1]:
+                end = start + len(payload) // 4 * 3
+                decoded.append(data[start:end])
+                start = end
+            decoded.append(data[start:])
+            return decoded
+    return [b64decode(payload) for payload in payloads]
+
+
+# Maps each content block type to the function converting it to a Part
+_CONTENT_HANDLERS: dict[str, Callable[[ContentBlock], types.Part | None]] = {
+    "text": _text_part,
+    "image_url": _image_url_part,
+    "image": _image_part,
+    "file": _file_part,
+}
+
 
 def multi_content_to_part(
-    contents: Sequence[dict[str, str | dict[str, str]] | str],
+    contents: Sequence[ContentBlock | str],
 ) -> list[types.Part]:
     """Convert sequence content to a Part object.
 
@@ -58,70 +218,31 @@ def multi_content_to_part(
                 }
             ]
     """
+    # Decode small inline payloads in one batch to amortize the decoder overhead
+    inline_data = {
+        i: block
+        for i, content in enumerate(contents)
+        if (block := _inline_data(content, _BATCH_DECODE_SIZE)) is not None
+    }
+    decoded_parts: dict[int, types.Part] = {}
+    if len(inline_data) > 1:
+        decoded = _b64decode_many([data for _, data in inline_data.values()])
+        for (i, (mime_type, _)), data in zip(inline_data.items(), decoded):
+            decoded_parts[i] = types.Part.from_bytes(data=data, mime_type=mime_type)
+
     parts = []
-    for content in contents:
+    for i, content in enumerate(contents):
+        if i in decoded_parts:
+            parts.append(decoded_parts[i])
+            continue
         assert isinstance(content, dict), "Expected dict content"
         assert "type" in content, "Received dict content without type"
-        if content["type"] == "text":
-            assert "text" in content, "Expected 'text' in content"
-            if content["text"]:
-                assert isinstance(content["text"], str), "Expected str content"
-                parts.append(types.Part(text=content["text"]))
-        elif content["type"] == "image_url":
-            assert isinstance(content["image_url"], dict), "Expected dict image_url"
-            assert "url" in content["image_url"], "Expected 'url' in content"
-            split_url: tuple[str, str] = content["image_url"]["url"].split(",", 1)  # type: ignore
-            header, encoded_data = split_url
-            mime_type = header.split(":", 1)[1].split(";", 1)[0]
-            data = base64.b64decode(encoded_data)
-            parts.append(types.Part.from_bytes(data=data, mime_type=mime_type))
-        elif content["type"] == "image":
-            if "data" in content:
-                assert isinstance(content["data"], str), "Expected str data"
-                assert "mime_type" in content, "Expected 'mime_type' in content"
-                assert isinstance(content["mime_type"], str), "Expected str mime_type"
-                data = base64.b64decode(content["data"])
-                parts.append(
-                    types.Part.from_bytes(data=data, mime_type=content["mime_type"])
-                )
-            elif "url" in content:
-                assert isinstance(content["url"], str), "Expected str url"
-                mime_type = content.get("mime_type", None)
-                assert mime_type is None or isinstance(
-                    mime_type, str
-                ), "Expected str mime_type"
-                parts.append(
-                    types.Part.from_uri(file_uri=content["url"], mime_type=mime_type)
-                )
-            else:
-                raise ValueError(
-                    "Expected either 'data' or 'url' in content for image type"
-                )
-        elif content["type"] == "file":
-            if "data" in content:
-                assert isinstance(content["data"], str), "Expected str data"
-                assert "mime_type" in content, "Expected 'mime_type' in content"
-                assert isinstance(content["mime_type"], str), "Expected str mime_type"
-                data = base64.b64decode(content["data"])
-                parts.append(
-                    types.Part.from_bytes(data=data, mime_type=content["mime_type"])
-                )
-            elif "url" in content:
-                assert isinstance(content["url"], str), "Expected str url"
-                assert content["url"], "File URI is required"
-                mime_type = content.get("mime_type", None)
-                assert mime_type is None or isinstance(
-                    mime_type, str
-                ), "Expected str mime_type"
-                parts.append(
-                    types.Part.from_uri(file_uri=content["url"], mime_type=mime_type)
-                )
-            else:
-                raise ValueError(
-                    "Expected either 'data' or 'url' in content for file type"
-                )
-        else:
+        handler = _CONTENT_HANDLERS.get(content["type"])  # type: ignore[arg-type]
+        if handler is None:
             raise ValueError(f"Unknown content type: {content['type']}")
+        part = handler(content)
+        if part is not None:
+            parts.append(part)
     return parts
 
 
@@ -143,6 +264,90 @@ def convert_base_message_to_parts(
     return parts
 
 
+def _add_human_message(message: HumanMessage, contents: list[types.Content]) -> None:
+    parts = convert_base_message_to_parts(message)
+    # The parts are known to be valid, skip pydantic validation
+    contents.append(types.UserContent.model_construct(parts=parts))
+
+
+def _add_ai_message(message: AIMessage, contents: list[types.Content]) -> None:
+    # Function calls are appended to the (freshly built) text parts
+    parts = convert_base_message_to_parts(message)
+    if message.tool_calls:
+        # Example of tool_call
+        # tool_call = {
+        #     "name": "foo",
+        #     "args": {"a": 1},
+        #     "id": "123"
+        # }
+        for tool_call in message.tool_calls:
+            tool_id = tool_call["id"]
+            assert tool_id, "Tool call ID is required"
+            parts.append(
+                types.Part(
+                    function_call=types.FunctionCall(
+                        name=tool_call["name"],
+                        args=tool_call["args"],
+                        id=tool_id,
+                    ),
+                )
+            )
+
+    # The parts are known to be valid, skip pydantic validation
+    contents.append(types.ModelContent.model_construct(parts=parts))
+
+
+def _add_tool_message(message: ToolMessage, contents: list[types.Content]) -> None:
+    # Note: We tried combining function_call and function_response into one
+    # part, but that throws a 4xx server error.
+    assert isinstance(message.content, str), "Expected str content"
+    assert message.name, "Tool name is required"
+    tool_part = types.Part(
+        function_response=types.FunctionResponse(
+            id=message.tool_call_id,
+            name=message.name,
+            response={"output": message.content},
+        ),
+    )
+
+    # Ensure that all function_responses are in a single content
+    last_content = contents[-1]
+    last_content_part = last_content.parts[-1]
+    if last_content_part.function_response:
+        # Merge with the last content
+        last_content.parts.append(tool_part)
+    else:
+        # Create a new content
+        contents.append(types.UserContent.model_construct(parts=[tool_part]))
+
+
+def _add_system_message(message: SystemMessage, contents: list[types.Content]) -> None:
+    # There is no genai.types equivalent for SystemMessage
+    pass
+
+
+# Maps each message type to the function adding it to the contents
+_MESSAGE_HANDLERS: dict[type, Callable[[Any, list[types.Content]], None]] = {
+    HumanMessage: _add_human_message,
+    AIMessage: _add_ai_message,
+    ToolMessage: _add_tool_message,
+    SystemMessage: _add_system_message,
+}
+
+
+def _get_message_handler(
+    message: BaseMessage,
+) -> Callable[[Any, list[types.Content]], None]:
+    handler = _MESSAGE_HANDLERS.get(type(message))
+    if handler is not None:
+        return handler
+    # Fall back to isinstance checks for subclasses, e.g. message chunks
+    for message_type, handler in _MESSAGE_HANDLERS.items():
+        if isinstance(message, message_type):
+            return handler
+    raise ValueError(f"Invalid message type: {type(message)}")
+
+
 def convert_messages_to_contents(
     messages: Sequence[BaseMessage],
 ) -> list[types.Content]:
@@ -154,71 +359,28 @@ def convert_messages_to_contents(
     Returns:
         A list of Google GenAI Content objects
     """
-    contents = []
+    contents: list[types.Content] = []
 
     for message in messages:
-        if isinstance(message, HumanMessage):
-            parts = convert_base_message_to_parts(message)
-            contents.append(types.UserContent(parts=parts))
-        elif isinstance(message, AIMessage):
-            text_parts = convert_base_message_to_parts(message)
-            function_parts = []
-            if message.tool_calls:
-                # Example of tool_call
-                # tool_call = {
-                #     "name": "foo",
-                #     "args": {"a": 1},
-                #     "id": "123"
-                # }
-                for tool_call in message.tool_calls:
-                    tool_id = tool_call["id"]
-                    assert tool_id, "Tool call ID is required"
-                    function_parts.append(
-                        types.Part(
-                            function_call=types.FunctionCall(
-                                name=tool_call["name"],
-                                args=tool_call["args"],
-                                id=tool_id,
-                            ),
-                        )
-                    )
-
-            contents.append(
-                types.ModelContent(
-                    parts=[*text_parts, *function_parts],
-                )
-            )
-        elif isinstance(message, ToolMessage):
-            # Note: We tried combining function_call and function_response into one
-            # part, but that throws a 4xx server error.
-            assert isinstance(message.content, str), "Expected str content"
-            assert message.name, "Tool name is required"
-            tool_part = types.Part(
-                function_response=types.FunctionResponse(
-                    id=message.tool_call_id,
-                    name=message.name,
-                    response={"output": message.content},
-                ),
-            )
-
-            # Ensure that all function_responses are in a single content
-            last_content = contents[-1]
-            last_content_part = last_content.parts[-1]
-            if last_content_part.function_response:
-                # Merge with the last content
-                last_content.parts.append(tool_part)
-            else:
-                # Create a new content
-                contents.append(types.UserContent(parts=[tool_part]))
-        elif isinstance(message, SystemMessage):
-            # There is no genai.types equivalent for SystemMessage
-            pass
-        else:
-            raise ValueError(f"Invalid message type: {type(message)}")
+        _get_message_handler(message)(message, contents)
 
     return contents
 
 
+async def aconvert_messages_to_contents(
+    messages: Sequence[BaseMessage],
+) -> list[types.Content]:
+    """Async version of `convert_messages_to_contents`.
+
+    Messages with large inline data are converted in a worker thread, so that
+    decoding them does not block the event loop.
+    """
+    inline_data_size = sum(_inline_data_size(message) for message in messages)
+    if inline_data_size > _LARGE_INLINE_DATA_SIZE:
+        return await asyncio.to_thread(convert_messages_to_contents, messages)
+    return convert_messages_to_contents(messages)
+
+
 def parse_response_candidate(response_candidate: types.Candidate) -> AIMessageChunk:
     content: None | str | list[str] = None
     additional_kwargs = {}
@@ -2,6 +2,7 @@
 Comprehensive tests for the CitationMixin class.
 """
 
+import asyncio
 from collections.abc import Sequence
 from typing import Any
 from unittest.mock import patch
@@ -447,3 +448,47 @@ class TestCitationMixin:
             # Should propagate the error from citation processing
             with pytest.raises(RuntimeError, match="Citation error"):
                 await model.agenerate(messages)
+
+    @pytest.mark.asyncio
+    async def test_citation_mixin_adds_citations_concurrently(self):
+        """Test that citations are added to all generations concurrently."""
+
+        model = MockChatModel()
+        messages: list[list[BaseMessage]] = [
+            [HumanMessage(content="First batch")],
+            [HumanMessage(content="Second batch")],
+        ]
+
+        in_flight = 0
+        max_in_flight = 0
+
+        async def fake_add_citations(model, messages, message, system_prompt, **kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            return AIMessage(content=f"Cited: {message.content}")
+
+        with (
+            patch.object(
+                CitationMixin.__bases__[0], "agenerate"
+            ) as mock_parent_agenerate,
+            patch(
+                "langchain_b12.citations.citations.add_citations",
+                side_effect=fake_add_citations,
+            ),
+        ):
+            mock_parent_agenerate.return_value = LLMResult(
+                generations=[
+                    [ChatGeneration(message=AIMessage(content="First response"))],
+                    [ChatGeneration(message=AIMessage(content="Second response"))],
+                ]
+            )
+
+            result = await model.agenerate(messages)
+
+        assert max_in_flight == 2
+        # Generations keep their order
+        assert result.generations[0][0].message.content == "Cited: First response"
+        assert result.generations[1][0].message.content == "Cited: Second response"
@@ -1,15 +1,19 @@
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, patch
 
 import pytest
 from langchain_b12.citations.citations import (
     SYSTEM_PROMPT,
     Citation,
+    CitationCache,
     Citations,
     Match,
     add_citations,
     contains_context_tags,
     create_citation_model,
+    find_match,
     merge_citations,
+    messages_contain_context_tags,
+    split_and_number,
     split_into_sentences,
     validate_citations,
 )
@@ -70,6 +74,17 @@ class TestUtilityFunctions:
             reconstructed = "".join(sentences)
             assert reconstructed == text, f"Failed for text: {repr(text)}"
 
+    def test_split_and_number(self):
+        """Test splitting text into numbered sentences."""
+        text = " ".join(f"Sentence {i}." for i in range(11))
+        sentences, numbered = split_and_number(text)
+
+        assert sentences == split_into_sentences(text)
+        lines = numbered.split("\n")
+        assert len(lines) == 11
+        assert lines[0] == " 0: Sentence 0."
+        assert lines[10] == "10: Sentence 10."
+
     def test_contains_context_tags(self):
         """Test context tag detection."""
         # Text with context tags
@@ -98,9 +113,23 @@ class TestUtilityFunctions:
         """
         assert contains_context_tags(text) is True
 
+        # Non-ASCII whitespace between the tag name and the key
+        text = '<context\xa0key="test">Context content</context>'
+        assert contains_context_tags(text) is True
+
         # Empty string
         assert contains_context_tags("") is False
 
+    def test_messages_contain_context_tags(self):
+        """Test context tag detection over several messages."""
+        messages = [
+            HumanMessage(content="Just regular text"),
+            HumanMessage(content='<context key="test">Context content</context>'),
+        ]
+        assert messages_contain_context_tags(messages) is True
+        assert messages_contain_context_tags(messages[:1]) is False
+        assert messages_contain_context_tags([]) is False
+
     def test_merge_citations(self):
         """Test merging citations with sentences."""
         sentences = ["First sentence.", "Second sentence.", "Third sentence."]
@@ -154,6 +183,49 @@ class TestUtilityFunctions:
         assert result[2]["citations"][1]["dist"] is None
         assert result[2]["citations"][1]["generated_cited_text"] == "source text 4"
 
+    def test_merge_citations_out_of_range(self):
+        """Test that citations referring to non-existing sentences are ignored."""
+        sentences = ["First sentence.", "Second sentence."]
+        citations_with_matches: list[tuple[Citation, Match | None]] = [
+            (Citation(sentence_index=2, cited_text="text", key="key1"), None),
+            (Citation(sentence_index=-1, cited_text="text", key="key2"), None),
+            (Citation(sentence_index=1, cited_text="text", key="key3"), None),
+        ]
+
+        result = merge_citations(sentences, citations_with_matches)
+
+        assert len(result) == 2
+        assert result[0]["citations"] is None
+        assert len(result[1]["citations"]) == 1
+        assert result[1]["citations"][0]["key"] == "key3"
+
+    def test_find_match(self):
+        """Test finding exact and fuzzy matches of cited text."""
+        text = "The grass is green. The sky is blue."
+
+        # Exact match
+        match = find_match("sky is blue", [text])
+        assert match == {"start": 24, "end": 35, "dist": 0, "matched": "sky is blue"}
+
+        # Fuzzy match
+        match = find_match("sky iz blue", [text])
+        assert match is not None
+        assert match["dist"] == 1
+        assert match["matched"] == "sky is blue"
+
+        # No match
+        assert find_match("completely unrelated", [text]) is None
+
+        # Positions are relative to the texts joined by newlines
+        match = find_match("sky is blue", ["Some other text.", text])
+        assert match is not None
+        assert match["start"] == len("Some other text.") + 1 + 24
+
+        # Exact matches are preferred over fuzzy matches in earlier texts
+        match = find_match("sky is blue", ["The sky iz blue.", text])
+        assert match is not None
+        assert match["dist"] == 0
+
     def test_validate_citations(self):
         """Test citation validation."""
         sentences = ["First sentence.", "Second sentence."]
@@ -206,6 +278,37 @@ class TestUtilityFunctions:
         assert citation2.key == "test"
         assert match2 is None
 
+    def test_validate_citations_long_transcript(self):
+        """Test that long transcripts are searched in all messages."""
+        sentences = ["First sentence."]
+        messages = [
+            HumanMessage(content="Quoted outside of the contexts. " * 5_000),
+            HumanMessage(content="<context key='test'>Quoted in a context</context>"),
+        ]
+        citations = Citations(
+            values=[
+                Citation(
+                    sentence_index=0,
+                    cited_text="Quoted outside of the contexts.",
+                    key="test",
+                ),
+                Citation(
+                    sentence_index=0, cited_text="Quoted in a context", key="test"
+                ),
+            ]
+        )
+
+        validated = validate_citations(citations, messages, sentences)
+
+        assert len(validated) == 2
+        assert validated[0][1] is not None
+        assert validated[0][1]["start"] == 0
+        assert validated[1][1] is not None
+        assert validated[1][1]["matched"] == "Quoted in a context"
+        # Positions are relative to the messages joined by newlines
+        start = len(messages[0].content) + 1 + len("<context key='test'>")
+        assert validated[1][1]["start"] == start
+
 
 class TestAddCitations:
     """Test the main add_citations function."""
@@ -331,6 +434,97 @@ class TestAddCitations:
         assert result.content[0]["citations"][0]["key"] == "key1"
         assert result.content[1]["citations"][0]["key"] == "key2"
 
+    @pytest.mark.asyncio
+    async def test_add_citations_with_cache(self):
+        """Test that cached citations skip the citation model invocation."""
+        model = AsyncMock(spec=BaseChatModel)
+        model._get_llm_string.return_value = "mock-model"
+        structured_output_mock = AsyncMock()
+        model.with_structured_output.return_value = structured_output_mock
+        structured_output_mock.ainvoke.return_value = Citations(
+            values=[Citation(sentence_index=0, cited_text="test context", key="key1")]
+        )
+
+        cache = CitationCache()
+        messages = [HumanMessage(content='<context key="key1">test context</context>')]
+
+        first = await add_citations(
+            model,
+            messages,
+            AIMessage(content="This uses test context."),
+            SYSTEM_PROMPT,
+            cache=cache,
+        )
+        second = await add_citations(
+            model,
+            messages,
+            AIMessage(content="This uses test context."),
+            SYSTEM_PROMPT,
+            cache=cache,
+        )
+
+        structured_output_mock.ainvoke.assert_called_once()
+        assert first.content == second.content
+
+        # A different message is a cache miss
+        await add_citations(
+            model,
+            messages,
+            AIMessage(content="This is another message."),
+            SYSTEM_PROMPT,
+            cache=cache,
+        )
+        assert structured_output_mock.ainvoke.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_add_citations_min_length(self):
+        """Test that short single sentence messages skip the citation model."""
+        model = AsyncMock(spec=BaseChatModel)
+        messages = [HumanMessage(content='<context key="key1">test context</context>')]
+        message = AIMessage(content="Sure!")
+
+        result = await add_citations(
+            model, messages, message, SYSTEM_PROMPT, min_length=40
+        )
+
+        model.with_structured_output.assert_not_called()
+        assert result.content == [{"text": "Sure!", "citations": None, "type": "text"}]
+
+
+class TestCitationCache:
+    """Test the CitationCache class."""
+
+    def test_lookup_and_update(self):
+        """Test storing and retrieving citations."""
+        cache = CitationCache()
+        citations = Citations(values=[])
+
+        assert cache.lookup(b"key") is None
+        cache.update(b"key", citations)
+        assert cache.lookup(b"key") is citations
+
+        cache.clear()
+        assert cache.lookup(b"key") is None
+
+    def test_expiry(self):
+        """Test that entries expire after the ttl."""
+        cache = CitationCache(ttl=-1)
+        cache.update(b"key", Citations(values=[]))
+
+        assert cache.lookup(b"key") is None
+
+    def test_eviction(self):
+        """Test that the least recently used entry is evicted."""
+        cache = CitationCache(maxsize=2)
+        cache.update(b"a", Citations(values=[]))
+        cache.update(b"b", Citations(values=[]))
+        cache.lookup(b"a")
+        cache.update(b"c", Citations(values=[]))
+
+        assert cache.lookup(b"a") is not None
+        assert cache.lookup(b"b") is None
+        assert cache.lookup(b"c") is not None
+
 
 class TestCreateCitationModel:
     """Test the create_citation_model function."""
@@ -352,6 +546,32 @@ class TestCreateCitationModel:
         assert isinstance(result, AIMessage)
         assert result.content == "Response without context tags."
 
+    @pytest.mark.asyncio
+    async def test_create_citation_model_without_contexts(self):
+        """Test that the citation model is not used without context tags."""
+        base_model = AsyncMock(spec=BaseChatModel)
+        citation_model_instance = AsyncMock(spec=BaseChatModel)
+        base_model.ainvoke.return_value = AIMessage(content="The sky is blue.")
+
+        citation_model = create_citation_model(
+            base_model, citation_model=citation_model_instance
+        )
+        result = await citation_model.ainvoke([HumanMessage(content="Test message")])
+
+        citation_model_instance.with_structured_output.assert_not_called()
+        assert result.content == "The sky is blue."
+
+    @pytest.mark.asyncio
+    async def test_create_citation_model_error(self):
+        """Test that errors of the base model are propagated."""
+        base_model = AsyncMock(spec=BaseChatModel)
+        base_model.ainvoke.side_effect = RuntimeError("Model error")
+
+        citation_model = create_citation_model(base_model)
+
+        with pytest.raises(RuntimeError, match="Model error"):
+            await citation_model.ainvoke([HumanMessage(content="Test message")])
+
     @pytest.mark.asyncio
     async def test_create_citation_model_end_to_end(self):
         """Test complete end-to-end citation model functionality."""
@@ -415,6 +635,30 @@ class TestCreateCitationModel:
         assert result.content[1]["citations"][0]["key"] == "nature"
         assert "dist" in result.content[1]["citations"][0]
 
+    @pytest.mark.asyncio
+    async def test_create_citation_model_scans_contexts_once(self):
+        """Test that the messages are scanned for context tags only once."""
+        base_model = AsyncMock(spec=BaseChatModel)
+        base_model.ainvoke.return_value = AIMessage(content="The sky is blue.")
+        structured_output_mock = AsyncMock()
+        base_model.with_structured_output.return_value = structured_output_mock
+        structured_output_mock.ainvoke.return_value = Citations(values=[])
+
+        citation_model = create_citation_model(base_model)
+        messages = [
+            HumanMessage(content="What color is the sky?"),
+            HumanMessage(content='<context key="weather">The sky is blue</context>'),
+        ]
+
+        with patch(
+            "langchain_b12.citations.citations.contains_context_tags",
+            wraps=contains_context_tags,
+        ) as mock_contains_context_tags:
+            await citation_model.ainvoke(messages)
+
+        structured_output_mock.ainvoke.assert_called_once()
+        assert mock_contains_context_tags.call_count == len(messages)
+
 
 class TestEdgeCases:
     """Test edge cases and error conditions."""
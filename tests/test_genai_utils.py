@@ -1,9 +1,11 @@
+import asyncio
 import base64
 from unittest.mock import MagicMock, patch
 
 import pytest
 from google.genai import types
 from langchain_b12.genai.genai_utils import (
+    aconvert_messages_to_contents,
     convert_base_message_to_parts,
     convert_messages_to_contents,
     multi_content_to_part,
@@ -11,7 +13,9 @@ from langchain_b12.genai.genai_utils import (
 )
 from langchain_core.messages import (
     AIMessage,
+    AIMessageChunk,
     HumanMessage,
+    HumanMessageChunk,
     SystemMessage,
     ToolMessage,
 )
@@ -35,6 +39,13 @@ class TestMultiContentToPart:
 
         assert len(parts) == 0
 
+    def test_none_text_content(self):
+        """Test that text content without text is skipped."""
+        contents = [{"type": "text", "text": None}]
+        parts = multi_content_to_part(contents)
+
+        assert len(parts) == 0
+
     def test_image_url_content(self):
         """Test converting image_url content to Part."""
         # Create a simple base64 encoded image
@@ -59,6 +70,86 @@ class TestMultiContentToPart:
                 data=image_data, mime_type="image/jpeg"
             )
 
+    def test_image_url_content_without_base64_header(self):
+        """Test converting an image_url whose header has no ';base64' suffix."""
+        image_data = b"fake image data"
+        encoded_data = base64.b64encode(image_data).decode("utf-8")
+
+        contents = [
+            {
+                "type": "image_url",
+                "image_url": {"url": f"data:image/png,{encoded_data}"},
+            }
+        ]
+
+        with patch.object(types.Part, "from_bytes") as mock_from_bytes:
+            parts = multi_content_to_part(contents)
+
+            assert len(parts) == 1
+            mock_from_bytes.assert_called_once_with(
+                data=image_data, mime_type="image/png"
+            )
+
+    def test_image_url_content_not_a_data_url(self):
+        """Test that an image_url without a data payload raises an error."""
+        contents = [
+            {
+                "type": "image_url",
+                "image_url": {"url": "https://example.com/image.png"},
+            }
+        ]
+
+        with pytest.raises(ValueError, match="Expected a base64 data URL in image_url"):
+            multi_content_to_part(contents)
+
+    def test_multiple_inline_images(self):
+        """Test converting several inline images, which are decoded in one batch."""
+        images = [b"first image!", b"second image", b"third!", b"fourth image data"]
+        encoded = [base64.b64encode(image).decode("utf-8") for image in images]
+
+        contents = [
+            {
+                "type": "image_url",
+                "image_url": {"url": f"data:image/jpeg;base64,{encoded[0]}"},
+            },
+            {"type": "text", "text": "Some text"},
+            {"type": "image", "data": encoded[1], "mime_type": "image/png"},
+            {"type": "file", "data": encoded[2], "mime_type": "application/pdf"},
+            {"type": "image", "data": encoded[3], "mime_type": "image/png"},
+        ]
+
+        parts = multi_content_to_part(contents)
+
+        assert len(parts) == 5
+        assert parts[0].inline_data.data == images[0]
+        assert parts[0].inline_data.mime_type == "image/jpeg"
+        assert parts[1].text == "Some text"
+        assert parts[2].inline_data.data == images[1]
+        assert parts[2].inline_data.mime_type == "image/png"
+        assert parts[3].inline_data.data == images[2]
+        assert parts[3].inline_data.mime_type == "application/pdf"
+        assert parts[4].inline_data.data == images[3]
+
+    def test_multiple_inline_images_with_padding(self):
+        """Test converting several inline images with padded base64 data."""
+        images = [b"padded", b"padded image", b"also padded"]
+        encoded = [base64.b64encode(image).decode("utf-8") for image in images]
+        assert encoded[2].endswith("=")
+
+        contents = [
+            {"type": "image", "data": encoded[2], "mime_type": "image/png"},
+            {"type": "image", "data": encoded[0], "mime_type": "image/png"},
+            {"type": "image", "data": encoded[1], "mime_type": "image/png"},
+        ]
+
+        parts = multi_content_to_part(contents)
+
+        assert [part.inline_data.data for part in parts] == [
+            images[2],
+            images[0],
+            images[1],
+        ]
+
     def test_image_content_with_base64_data(self):
         """Test converting image content with base64 data to Part."""
         image_data = b"fake image data"
@@ -358,6 +449,20 @@ class TestConvertMessagesToContents:
         assert len(contents) == 1  # Only HumanMessage converted
         assert isinstance(contents[0], types.UserContent)
 
+    def test_message_subclasses(self):
+        """Test converting subclasses of the supported message types."""
+        messages = [
+            HumanMessageChunk(content="Hello"),
+            AIMessageChunk(content="Hi there"),
+        ]
+        contents = convert_messages_to_contents(messages)
+
+        assert len(contents) == 2
+        assert isinstance(contents[0], types.UserContent)
+        assert contents[0].parts[0].text == "Hello"
+        assert isinstance(contents[1], types.ModelContent)
+        assert contents[1].parts[0].text == "Hi there"
+
     def test_invalid_message_type(self):
         """Test handling of invalid message type."""
         # Create a mock message with invalid type
@@ -394,6 +499,41 @@ class TestConvertMessagesToContents:
             convert_messages_to_contents(messages)
 
 
+class TestAConvertMessagesToContents:
+    """Test the aconvert_messages_to_contents function."""
+
+    @pytest.mark.asyncio
+    async def test_small_message_converted_inline(self):
+        """Test that messages without large inline data are converted inline."""
+        messages = [HumanMessage(content="Hello")]
+
+        with patch("asyncio.to_thread") as mock_to_thread:
+            contents = await aconvert_messages_to_contents(messages)
+
+        mock_to_thread.assert_not_called()
+        assert contents == convert_messages_to_contents(messages)
+
+    @pytest.mark.asyncio
+    async def test_large_message_converted_in_thread(self):
+        """Test that messages with large inline data are converted in a thread."""
+        image_data = b"x" * 100_000
+        encoded_data = base64.b64encode(image_data).decode("utf-8")
+        messages = [
+            HumanMessage(
+                content=[
+                    {"type": "image", "data": encoded_data, "mime_type": "image/png"}
+                ]
+            )
+        ]
+
+        with patch("asyncio.to_thread", wraps=asyncio.to_thread) as mock_to_thread:
+            contents = await aconvert_messages_to_contents(messages)
+
+        mock_to_thread.assert_called_once()
+        assert len(contents) == 1
+        assert contents[0].parts[0].inline_data.data == image_data
+
+
 class TestParseResponseCandidate:
     """Test the parse_response_candidate function."""
 